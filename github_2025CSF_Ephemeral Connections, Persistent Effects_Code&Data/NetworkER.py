@@ -1,231 +1,325 @@
-import networkx as nx
-import random
-import math
-from collections import deque
-
-# ---------------------------
-# Global Parameter Settings
-# ---------------------------
-# Network parameters
-SIZE = 10000        # Number of nodes
-R = 2               # R value, initial average degree of each node is 2*R
-p = (2 * R) / (SIZE - 1)  # Corresponding probability in ER network to make average degree approximately 2R
-# Game parameters
-M = 10              # Memory length, i.e., records of the most recent M rounds
-b = 1.2             # Payoff for a defector when playing against a cooperator (payoff is 1 when cooperating)
-r = 0.5             # Cooperation ratio threshold: if the cooperation ratio in the past M rounds is below this value, a stranger connection is made
-Ki = 3              # Number of strangers to randomly select and attempt to connect with in each round
-alpha = 0.1         # Cost coefficient for stranger connections
-steps_total = 10    # Total simulation rounds
-
-# ---------------------------
-# Define Agent class, each player records strategy, payoff, memory, and list of strangers
-# ---------------------------
-class Agent:
-    def __init__(self):
-        # Strategy: 0 for cooperator, 1 for defector; randomly assigned at initialization
-        self.strategy = random.randrange(2)
-        self.PreStrat = self.strategy    # Used to store the strategy of the previous round
-        self.payoff = 0.0                # Current accumulated payoff
-        self.memory = deque(maxlen=M)    # Deque to store decisions of the most recent M rounds (oldest record pops out automatically when full)
-        self.mi = 0                      # Number of cooperation (strategy == 0) decisions recorded in memory
-        self.strangers = []              # List of player IDs selected as stranger opponents in the current round
-
-    def update_memory(self):
-        """Adds the current round's decision to memory"""
-        self.memory.append(self.strategy)
-
-    def update_mi(self):
-        """Updates the count of cooperation decisions in memory"""
-        self.mi = sum(1 for decision in self.memory if decision == 0)
-
-# Global player list, each network node corresponds to an Agent
-Players = [Agent() for _ in range(SIZE)]
-
-# Num is used to count global cooperators and defectors, Num[0] is cooperators, Num[1] is defectors
-Num = [0, 0]
-
-# ---------------------------
-# Build an ER random network using NetworkX
-# ---------------------------
-def build_network(SIZE, R):
-    # Edge probability p for ER network = average degree / (number of nodes - 1)
-    avg_degree = 2 * R
-    p = avg_degree / (SIZE - 1)
-    G = nx.erdos_renyi_graph(SIZE, p)
-    return G
-
-
-G = build_network(SIZE, R)
-
-
-# ---------------------------
-# Initialize the state of all players
-# ---------------------------
-def initial():
-    global Num, Players
-    Num = [0, 0]
-    for i in range(SIZE):
-        Players[i].strategy = random.randrange(2)
-        Players[i].PreStrat = Players[i].strategy
-        Players[i].payoff = 0.0
-        # Initialize memory and strangers (deque is already initialized as empty)
-        Players[i].memory.clear()
-        Players[i].strangers.clear()
-        # Accumulate initial strategy distribution
-        Num[Players[i].strategy] += 1
-
-# ---------------------------
-# Single player game function
-# ---------------------------
-def game(x):
-    """
-    Calculates player x's payoff in the current round:
-    1. Game with fixed neighbors: iterate through all neighbors of x in the network.
-    2. When memory is full (M rounds), if x's historical cooperation ratio is below threshold r,
-       then randomly select Ki candidate stranger opponents (only check if their memory is full
-       and cooperation ratio < r), and engage in a stranger game.
-       Stranger game payoffs are also determined by strategy comparison, but incur a cost.
-    """
-    player = Players[x]
-    payoff = 0.0
-    strat = player.strategy
-
-    # Game with fixed neighbors: iterate through all neighbors of x in the NetworkX graph
-    for y in G.neighbors(x):
-        if strat == 0 and Players[y].strategy == 0:
-            payoff += 1
-        elif strat == 1 and Players[y].strategy == 0:
-            payoff += b
-
-    # Stranger connections are only considered when memory is full (M rounds)
-    if len(player.memory) == M:
-        cooperation_ratio = player.mi / M
-        ki = 0  # Records the number of stranger games played in the current round
-        if cooperation_ratio < r:
-            for _ in range(Ki):
-                stranger = random.randrange(SIZE)
-                # Only evaluate if the candidate's memory is full (M rounds)
-                if len(Players[stranger].memory) == M:
-                    stranger_ratio = Players[stranger].mi / M
-                    if stranger_ratio < r:
-                        if strat == 0 and Players[stranger].strategy == 0:
-                            payoff += 1
-                        elif strat == 1 and Players[stranger].strategy == 0:
-                            payoff += b
-                        ki += 1
-                        player.strangers.append(stranger)
-            # Stranger connections incur a cost: deduct b * alpha * (number of stranger participations)
-            payoff -= b * alpha * ki
-    return payoff
-
-# ---------------------------
-# Calculates the variation coefficient (CV) in the network
-# ---------------------------
-def calcCV():
-    # First, count the number of "incoming links" from stranger connections for each node
-    extra_in = [0] * SIZE
-    for j in range(SIZE):
-        for stranger in Players[j].strangers:
-            extra_in[stranger] += 1
-    degrees = [0.0] * SIZE
-    total = 0.0
-    for i in range(SIZE):
-        # Effective degree of node i = number of fixed neighbors (G.degree(i))
-        #                             + number of strangers actively selected by this node (len(Players[i].strangers))
-        #                             + number of times selected by other nodes via stranger connections (extra_in[i])
-        deg = G.degree(i) + len(Players[i].strangers) + extra_in[i]
-        degrees[i] = deg
-        total += deg
-    mu_k = total / SIZE
-    sq_diff_sum = sum((d - mu_k)**2 for d in degrees)
-    sigma_k = math.sqrt(sq_diff_sum / SIZE)
-    return sigma_k / mu_k
-
-# ---------------------------
-# Strategy update function
-# ---------------------------
-def change_strat(playerX, playerY):
-    """
-    When playerX and playerY compare their payoffs,
-    if playerY's payoff is higher, playerX probabilistically changes
-    its strategy to playerY's previous strategy.
-    """
-    global Num
-    payoffX = Players[playerX].payoff
-    payoffY = Players[playerY].payoff
-    # Take the larger of the fixed neighbor counts of both as Kmax
-    Kmax = max(G.degree(playerX), G.degree(playerY))
-    if Kmax == 0:
-        # Directly set probability to 0 or set Kmax to 1 to avoid division by zero
-        probability = 0
-    else:
-        probability = (payoffY - payoffX) / (b * Kmax) if payoffY >= payoffX else 0
-    if random.random() < probability:
-        # Update global statistics: decrement count of original strategy and increment count of new strategy
-        Num[Players[playerX].strategy] -= 1
-        # Here playerX learns playerY's previous strategy PreStrat
-        Players[playerX].strategy = Players[playerY].PreStrat
-        Num[Players[playerX].strategy] += 1
-
-# ---------------------------
-# Memory update related
-# ---------------------------
-def update_memory(playerX):
-    Players[playerX].update_memory()
-
-def update_mi(playerX):
-    Players[playerX].update_mi()
-
-# ---------------------------
-# Main program, executes the game simulation 
-# ---------------------------
-def main():
-    random.seed()  # Initialize random seed based on current time
-    initial()      # Initialize strategies and states of all players
-
-    outfile = open("ER.txt", "w", encoding="utf8")
-
-    for step in range(steps_total):
-        # Synchronous update: reset payoff for each player, record previous strategy, and update memory and mi count
-        for i in range(SIZE):
-            Players[i].payoff = 0.0
-            Players[i].PreStrat = Players[i].strategy
-            update_memory(i)
-            update_mi(i)
-
-        # Calculate the game payoff for each player in the current round
-        for i in range(SIZE):
-            Players[i].payoff = game(i)
-
-        # Strategy update phase
-        for i in range(SIZE):
-            playerX = i
-            # Construct a list of potential players: first add fixed neighbors
-            potentialPlayerY = list(G.neighbors(playerX))
-            # If playerX's memory is full (M rounds) and its cooperation ratio is below r,
-            # and its strangers list is not empty,
-            # then also add the strangers with whom a game was played to the candidate list
-            if len(Players[playerX].memory) == M and (Players[playerX].mi / M) < r and Players[playerX].strangers:
-                potentialPlayerY.extend(Players[playerX].strangers)
-            if potentialPlayerY:
-                playerY = random.choice(potentialPlayerY)
-                change_strat(playerX, playerY)
-
-        # Calculate and output the Coefficient of Variation (CV) of degree and global cooperation ratio P_c for the current round
-        CV = calcCV()
-        P_c = Num[0] / SIZE
-        line = f"{step}\tCV={CV:.4f}\tP_c={P_c:.4f}\n"
-        print(line, end="")
-        outfile.write(line)
-
-        # Clear the stranger list recorded for each player at the end of each round
-        for i in range(SIZE):
-            Players[i].strangers.clear()
-
-    outfile.close()
-
-if __name__ == '__main__':
-    main()
-
-
+import numpy as np
+from scipy import sparse
+from numba import njit, prange
+
+# ---------------------------
+# Global Parameter Settings
+# ---------------------------
+# Network parameters
+SIZE = 10000        # Number of nodes
+R = 2               # R value, initial average degree of each node is 2*R
+p = (2 * R) / (SIZE - 1)  # Corresponding probability in ER network to make average degree approximately 2R
+# Game parameters
+M = 10              # Memory length, i.e., records of the most recent M rounds
+b = 1.2             # Payoff for a defector when playing against a cooperator (payoff is 1 when cooperating)
+r = 0.5             # Cooperation ratio threshold: if the cooperation ratio in the past M rounds is below this value, a stranger connection is made
+Ki = 3              # Number of strangers to randomly select and attempt to connect with in each round
+alpha = 0.1         # Cost coefficient for stranger connections
+steps_total = 10    # Total simulation rounds
+
+# ---------------------------
+# Player state stored as Structure-of-Arrays: one NumPy array per attribute
+# instead of one Python object per player
+# ---------------------------
+# Strategy: 0 for cooperator, 1 for defector; randomly assigned at initialization.
+# Strategies are double-buffered: the update kernel reads the previous round
+# from one array and writes the new round into the other, and the two are
+# swapped each round instead of copying strategy into a PreStrat array
+strategy = np.random.randint(0, 2, SIZE, dtype=np.int8)
+strategy_next = np.empty_like(strategy)
+payoff = np.zeros(SIZE)              # Current accumulated payoff
+mi = np.zeros(SIZE, dtype=np.int8)   # Number of cooperation (strategy == 0) decisions recorded in memory (<= M)
+# Memory of the most recent M rounds, bit-packed into one word per player:
+# bit k of mem_bits[i] holds player i's decision in ring slot k (1 = defect),
+# so each player's whole memory is 8 bytes regardless of M (requires M <= 63).
+# Slot mem_head is overwritten each round, mem_len counts how many rounds are
+# recorded so far; all players record every round, so both are shared globally.
+mem_bits = np.zeros(SIZE, dtype=np.int64)
+mem_head = 0
+mem_len = 0
+# Stranger opponents played in the current round, stored CSR-style: the
+# compiled stranger kernel fills the padded strangers_flat / strangers_cnt
+# buffers (stride Ki per player), which are compacted once per round into
+# strangers_idx with row boundaries in strangers_ptr
+strangers_flat = np.zeros(SIZE * Ki, dtype=np.int32)
+strangers_cnt = np.zeros(SIZE, dtype=np.int32)
+
+# ---------------------------
+# Build an ER random network directly in CSR form
+# ---------------------------
+@njit(cache=True)
+def sample_gnp_edges(n, p, cap):
+    """
+    Samples the edge list of a G(n, p) random graph in O(n + m) time by
+    geometric skipping over the ordered pairs (i, j) with j < i, writing at
+    most cap edges into preallocated arrays.
+    """
+    u = np.empty(cap, dtype=np.int32)
+    v = np.empty(cap, dtype=np.int32)
+    m = 0
+    i = 1
+    j = -1
+    lp = np.log(1.0 - p)
+    while i < n:
+        lr = np.log(1.0 - np.random.random())
+        j += 1 + int(lr / lp)
+        while j >= i and i < n:
+            j -= i
+            i += 1
+        if i < n and m < cap:
+            u[m] = i
+            v[m] = j
+            m += 1
+    return u[:m], v[:m]
+
+def build_network(SIZE, R):
+    # Edge probability p for ER network = average degree / (number of nodes - 1)
+    avg_degree = 2 * R
+    p = avg_degree / (SIZE - 1)
+    # Expected edge count plus generous slack for the preallocated buffers
+    mean_m = p * SIZE * (SIZE - 1) / 2
+    cap = int(mean_m + 10 * np.sqrt(mean_m) + 100)
+    u, v = sample_gnp_edges(SIZE, p, cap)
+    # Symmetrize and pack into CSR; only the sparsity pattern matters
+    ones = np.ones(2 * len(u), dtype=np.float32)
+    A = sparse.coo_array((ones, (np.concatenate((u, v)), np.concatenate((v, u)))),
+                         shape=(SIZE, SIZE)).tocsr()
+    return A
+
+
+# CSR adjacency matrix of the fixed network: the neighbor-game phase is one
+# sparse matrix-vector product and the compiled kernels read the indptr /
+# indices arrays directly, so no graph object is needed at all
+A = build_network(SIZE, R)
+
+# Node degrees are the CSR row lengths
+deg = np.diff(A.indptr).astype(np.int32)
+
+
+# ---------------------------
+# Initialize the state of all players
+# ---------------------------
+def initial():
+    global mem_head, mem_len
+    strategy[:] = np.random.randint(0, 2, SIZE, dtype=np.int8)
+    payoff[:] = 0.0
+    # Initialize memory and strangers
+    mem_bits[:] = 0
+    mi[:] = 0
+    mem_head = 0
+    mem_len = 0
+    strangers_cnt[:] = 0
+
+# ---------------------------
+# Game payoff functions
+# ---------------------------
+def neighbor_payoffs():
+    """
+    Calculates every player's payoff from games with fixed neighbors in one shot.
+    Only cooperating neighbors contribute: a cooperator earns 1 and a defector
+    earns b per cooperating neighbor, so the payoff vector is the number of
+    cooperating neighbors (a single sparse matvec) scaled per strategy.
+    """
+    coop = (strategy == 0).astype(np.float32)
+    n_coop_nbrs = A @ coop
+    # The per-strategy scale is 1 for cooperators and b for defectors, which
+    # is the branchless 1 + (b - 1) * strategy since strategy is 0 or 1
+    return (1.0 + (b - 1.0) * strategy) * n_coop_nbrs
+
+@njit(cache=True, parallel=True)
+def stranger_round(strategy, mi, payoff, cand, strangers_flat, strangers_cnt,
+                   M_, b_, r_, alpha_, Ki_):
+    """
+    Plays all stranger games of the current round: each player whose historical
+    cooperation ratio is below threshold r considers Ki candidate stranger
+    opponents (only those whose cooperation ratio is also < r) and accumulates
+    the resulting payoff minus the connection cost. The opponents actually
+    played are written to row x of strangers_flat (strangers_cnt[x] entries).
+    Candidates are pre-drawn into cand so the compiled loop does no Python calls.
+    Callers must ensure memory is full (M rounds) before invoking this.
+    Each iteration writes only row x of the output buffers, so players can
+    be processed in parallel.
+    """
+    size = strategy.shape[0]
+    for x in prange(size):
+        strangers_cnt[x] = 0
+        if mi[x] / M_ < r_:
+            # Branchless per-game payoff: a cooperating opponent is worth 1
+            # to a cooperator and b to a defector, and a defecting opponent
+            # is worth 0 to either, so each game adds factor * (1 - opponent)
+            factor = 1.0 + (b_ - 1.0) * strategy[x]
+            base = x * Ki_
+            ki = 0  # Records the number of stranger games played in the current round
+            pay = 0.0
+            for s in range(Ki_):
+                stranger = cand[x, s]
+                if mi[stranger] / M_ < r_:
+                    pay += factor * (1.0 - strategy[stranger])
+                    strangers_flat[base + ki] = stranger
+                    ki += 1
+            # Stranger connections incur a cost: deduct b * alpha * (number of stranger participations)
+            payoff[x] += pay - b_ * alpha_ * ki
+            strangers_cnt[x] = ki
+
+# ---------------------------
+# Calculates the variation coefficient (CV) in the network
+# ---------------------------
+def calcCV(strangers_ptr, strangers_idx):
+    # First, count the number of "incoming links" from stranger connections for each node
+    extra_in = np.bincount(strangers_idx, minlength=SIZE)
+    # Effective degree of node i = number of fixed neighbors (deg[i])
+    #                             + number of strangers actively selected by this node (CSR row length)
+    #                             + number of times selected by other nodes via stranger connections (extra_in[i])
+    degrees = deg + np.diff(strangers_ptr) + extra_in
+    # Population standard deviation in a single pass, no explicit
+    # squared-difference temporary
+    return degrees.std() / degrees.mean()
+
+# ---------------------------
+# Strategy update function
+# ---------------------------
+@njit(cache=True, parallel=True)
+def update_round(strat_prev, strat_next, payoff, deg, indptr, indices,
+                 strangers_ptr, strangers_idx, pick_u, accept_u, b_):
+    """
+    Strategy update phase for all players: each player x picks a random
+    opponent y among its fixed neighbors plus the strangers it played this
+    round (an empty CSR row until memory is full). If y's payoff is higher,
+    x changes its strategy to y's previous strategy with probability
+    proportional to the payoff difference. The opponent-selection and
+    acceptance uniforms are pre-drawn into pick_u / accept_u in two batched
+    calls per round, leaving no RNG state in the kernel. Previous-round
+    strategies are read from strat_prev and the new ones written to
+    strat_next, so no separate PreStrat copy pass is needed; each iteration
+    writes only its own slot, so players can be updated in parallel. Returns
+    the number of cooperators after the update, counted in the same pass so
+    the cooperation ratio needs no extra sweep over the strategies.
+    """
+    size = strat_prev.shape[0]
+    n_coop = 0
+    for x in prange(size):
+        new = strat_prev[x]
+        # Potential opponents: fixed neighbors (CSR row x), then played strangers
+        ndeg = indptr[x + 1] - indptr[x]
+        npot = ndeg + (strangers_ptr[x + 1] - strangers_ptr[x])
+        if npot > 0:
+            # pick_u[x] is uniform on [0, 1), so this is a uniform index
+            pick = int(pick_u[x] * npot)
+            if pick < ndeg:
+                y = indices[indptr[x] + pick]
+            else:
+                y = strangers_idx[strangers_ptr[x] + (pick - ndeg)]
+            payoffX = payoff[x]
+            payoffY = payoff[y]
+            # A poorer opponent is never imitated, so skip the probability
+            # computation entirely in that common case
+            if payoffY >= payoffX:
+                # Take the larger of the fixed neighbor counts of both as Kmax
+                # (guarding against isolated pairs with Kmax == 0)
+                Kmax = max(deg[x], deg[y])
+                if Kmax > 0 and accept_u[x] < (payoffY - payoffX) / (b_ * Kmax):
+                    # Here player x learns player y's previous strategy
+                    new = strat_prev[y]
+        strat_next[x] = new
+        n_coop += 1 - new
+    return n_coop
+
+# ---------------------------
+# Memory update related
+# ---------------------------
+@njit(cache=True, parallel=True)
+def memory_round(strategy, mem_bits, mi, mem_head, full):
+    """
+    Records the current round's decisions in bit mem_head of each player's
+    packed memory word and maintains the cooperation counts incrementally
+    (add the decision entering the window, subtract the one being overwritten
+    once memory is full), in a single fused pass over the players.
+    """
+    size = strategy.shape[0]
+    mask = 1 << mem_head
+    for i in prange(size):
+        c = 1 - strategy[i]  # 1 if cooperating this round
+        if full:
+            old_defect = (mem_bits[i] >> mem_head) & 1
+            mi[i] += c - (1 - old_defect)
+        else:
+            mi[i] += c
+        # Clear the slot bit, then set it when defecting this round
+        mem_bits[i] = (mem_bits[i] & ~mask) | (strategy[i] << mem_head)
+
+def update_memory():
+    """Runs the fused memory/mi kernel and advances the shared ring position"""
+    global mem_head, mem_len
+    memory_round(strategy, mem_bits, mi, mem_head, mem_len == M)
+    if mem_len < M:
+        mem_len += 1
+    mem_head = (mem_head + 1) % M
+
+# ---------------------------
+# Main program, executes the game simulation
+# ---------------------------
+def main():
+    global strategy, strategy_next
+
+    np.random.seed()  # Initialize random seed based on current time
+    initial()         # Initialize strategies and states of all players
+
+    # Buffer the per-round output lines and write the file once at the end
+    lines = []
+
+    # Bind the hot arrays and functions to locals once, instead of repeating
+    # the attribute lookups on every round
+    indptr, indices = A.indptr, A.indices
+    randint, rand = np.random.randint, np.random.random
+
+    # CSR row boundaries / opponent IDs of the strangers played each round;
+    # all rows stay empty until memory is full
+    strangers_ptr = np.zeros(SIZE + 1, dtype=np.int64)
+    strangers_idx = np.empty(0, dtype=np.int32)
+
+    for step in range(steps_total):
+        # Synchronous update: record this round's decisions and update the mi
+        # counts; payoff is fully overwritten by neighbor_payoffs below and
+        # previous strategies live in the second buffer, so neither needs a
+        # separate reset or copy pass
+        update_memory()
+
+        # Calculate the game payoff for each player in the current round:
+        # vectorized fixed-neighbor phase, then the compiled stranger kernel.
+        # Stranger connections are only considered when memory is full (M
+        # rounds); all players fill memory in lockstep, so one global mem_len
+        # check covers both a player and any candidate stranger.
+        payoff[:] = neighbor_payoffs()
+        if mem_len == M:
+            cand = randint(0, SIZE, (SIZE, Ki))
+            stranger_round(strategy, mi, payoff, cand, strangers_flat,
+                           strangers_cnt, M, b, r, alpha, Ki)
+            # Compact the padded per-player rows into the (ptr, idx) pair
+            strangers_ptr[1:] = np.cumsum(strangers_cnt)
+            total = strangers_ptr[-1]
+            offsets = np.arange(total) - np.repeat(strangers_ptr[:-1], strangers_cnt)
+            strangers_idx = strangers_flat[np.repeat(np.arange(SIZE) * Ki, strangers_cnt) + offsets]
+
+        # Strategy update phase (compiled, parallel over players); the
+        # acceptance uniforms are drawn in one batched call, like the
+        # stranger candidates above
+        pick_u = rand(SIZE)
+        accept_u = rand(SIZE)
+        n_coop = update_round(strategy, strategy_next, payoff, deg, indptr, indices,
+                              strangers_ptr, strangers_idx, pick_u, accept_u, b)
+        strategy, strategy_next = strategy_next, strategy
+
+        # Calculate and output the Coefficient of Variation (CV) of degree and
+        # global cooperation ratio P_c for the current round; the cooperator
+        # count comes fused out of the update kernel
+        CV = calcCV(strangers_ptr, strangers_idx)
+        P_c = n_coop / SIZE
+        line = f"{step}\tCV={CV:.4f}\tP_c={P_c:.4f}\n"
+        print(line, end="")
+        lines.append(line)
+
+    with open("ER.txt", "w", encoding="utf8") as outfile:
+        outfile.writelines(lines)
+
+if __name__ == '__main__':
+    main()